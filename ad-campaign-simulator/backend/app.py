@@ -6,14 +6,15 @@
   It handles all the routes (URLs) and connects everything.
 
   HOW TO RUN:
-  1. Install requirements: pip install flask flask-cors
+  1. Install requirements: pip install -r requirements.txt
   2. Run: python app.py
   3. Open browser at http://localhost:5000
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, json
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import os
+from concurrent.futures import ThreadPoolExecutor
 
 # Import our custom modules
 from database import init_db, get_db_connection
@@ -21,21 +22,109 @@ from campaigns import (
     create_campaign,
     get_all_campaigns,
     get_campaign_by_id,
-    delete_campaign
+    delete_campaign,
+    get_campaigns_version,
+    get_campaign_insights,
+    refresh_campaign_scores
 )
-from diagnostics import run_diagnostics
+from diagnostics import run_diagnostics, hydrate
 from reports import generate_pdf_report
 
+# orjson encodes JSON in C - several times faster than the standard library
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Makes jsonify() and flask.json use orjson instead of the json module."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
 # -------------------------------------------------------
 # App Setup
 # -------------------------------------------------------
 app = Flask(__name__)
+if ORJSON_AVAILABLE:
+    app.json = OrjsonProvider(app)
 CORS(app)  # Allow frontend (different port) to talk to backend
 
 # Initialize the database when app starts
 init_db()
+refresh_campaign_scores()
 print("✅ Database initialized")
 
+# Serialized /api/insights payload, tagged with the campaigns version
+# it was built from: (version, payload). Any write to campaigns bumps the
+# version and makes it stale. Always replaced as a whole tuple, so a
+# request never sees one version's number with another version's data.
+_insights_cache = (None, None)
+
+# Fields every new campaign must include
+REQUIRED_FIELDS = frozenset({"name", "budget", "impressions", "clicks", "conversions"})
+
+# Small pool for work that shouldn't block a request (cache warming)
+_executor = ThreadPoolExecutor(max_workers=2)
+
+
+@app.teardown_request
+def _rollback_open_transaction(exc):
+    """
+    Safety net after every request: each thread reuses one database
+    connection, so a write that failed halfway must not leave it inside
+    an open transaction (that would lock every other writer out).
+    """
+    conn = get_db_connection()
+    if conn.in_transaction:
+        conn.rollback()
+
+
+def _campaigns_etag(version, *parts):
+    """
+    Builds an ETag value for data derived from the campaigns table.
+    It changes whenever a campaign is created, changed or deleted.
+    """
+    return "-".join([f"v{version}", *map(str, parts)])
+
+
+def _not_modified(etag):
+    """
+    Returns an empty 304 response if the client already has this ETag
+    (sent back in the If-None-Match header), otherwise None.
+    ("If-None-Match: *" is not answered here - it would also match a
+    campaign that does not exist, which must still get its 404.)
+    """
+    if request.if_none_match.star_tag:
+        return None
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+
+def _warm_diagnostics_cache():
+    """
+    Runs the full diagnostic engine for the newest campaigns in the
+    background, so the next /api/diagnose or /api/report click is served
+    from cache. Stops at the cache size - warming more would only push
+    out the results it just computed.
+    """
+    for campaign in get_all_campaigns()[:run_diagnostics.cache_info().maxsize]:
+        run_diagnostics(campaign)
+
 
 # -------------------------------------------------------
 # ROUTE: Home - just a health check
@@ -53,7 +142,8 @@ def home():
             "GET  /api/diagnose/<id>     - Run diagnostics on campaign",
             "GET  /api/insights          - Get all campaign insights",
             "GET  /api/report/<id>       - Export campaign as PDF",
-        ]
+        ],
+        "diagnostics_cache": run_diagnostics.cache_info()._asdict(),
     })
 
 
@@ -63,8 +153,15 @@ def home():
 @app.route("/api/campaigns", methods=["GET"])
 def list_campaigns():
     """Returns a list of all campaigns from the database."""
+    etag = _campaigns_etag(get_campaigns_version())
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
     campaigns = get_all_campaigns()
-    return jsonify({"campaigns": campaigns, "count": len(campaigns)})
+    response = jsonify({"campaigns": campaigns, "count": len(campaigns)})
+    response.set_etag(etag, weak=True)
+    return response
 
 
 # -------------------------------------------------------
@@ -79,11 +176,14 @@ def add_campaign():
     """
     data = request.get_json()
 
-    # Validate required fields
-    required = ["name", "budget", "impressions", "clicks", "conversions"]
-    for field in required:
-        if field not in data:
-            return jsonify({"error": f"Missing field: {field}"}), 400
+    # The body must be a JSON object ({...}), not a list or a string
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+
+    # Validate required fields (reports every missing field at once)
+    missing = REQUIRED_FIELDS - data.keys()
+    if missing:
+        return jsonify({"error": f"Missing fields: {', '.join(sorted(missing))}"}), 400
 
     campaign = create_campaign(data)
     return jsonify({"message": "Campaign created!", "campaign": campaign}), 201
@@ -95,10 +195,17 @@ def add_campaign():
 @app.route("/api/campaigns/<int:campaign_id>", methods=["GET"])
 def get_campaign(campaign_id):
     """Returns details of one specific campaign."""
+    etag = _campaigns_etag(get_campaigns_version(), campaign_id)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
     campaign = get_campaign_by_id(campaign_id)
     if not campaign:
         return jsonify({"error": "Campaign not found"}), 404
-    return jsonify(campaign)
+    response = jsonify(campaign)
+    response.set_etag(etag, weak=True)
+    return response
 
 
 # -------------------------------------------------------
@@ -127,7 +234,9 @@ def diagnose(campaign_id):
         return jsonify({"error": "Campaign not found"}), 404
 
     results = run_diagnostics(campaign)
-    return jsonify(results)
+    # Expand the issue records into full issues (title, root causes...)
+    # for the response only - the cached results stay small
+    return jsonify({**results, "issues": [hydrate(issue) for issue in results["issues"]]})
 
 
 # -------------------------------------------------------
@@ -135,19 +244,33 @@ def diagnose(campaign_id):
 # -------------------------------------------------------
 @app.route("/api/insights", methods=["GET"])
 def all_insights():
-    """Runs diagnostics on every campaign and returns summary."""
-    campaigns = get_all_campaigns()
-    insights = []
-    for c in campaigns:
-        result = run_diagnostics(c)
-        insights.append({
-            "campaign_id": c["id"],
-            "campaign_name": c["name"],
-            "issues_found": len(result["issues"]),
-            "health_score": result["health_score"],
-            "top_issue": result["issues"][0]["type"] if result["issues"] else "None"
-        })
-    return jsonify({"insights": insights})
+    """
+    Returns a diagnostics summary for every campaign.
+    Health scores are saved with each campaign when it's created, so this
+    is a single SELECT - and the serialized result is reused until a
+    campaign is created or deleted.
+    Full per-campaign details are computed in the background afterwards.
+
+    The response carries an ETag; if the client sends it back in
+    If-None-Match and nothing changed, we answer 304 with no body.
+    """
+    global _insights_cache
+
+    version = get_campaigns_version()
+    etag = _campaigns_etag(version)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+
+    cached_version, payload = _insights_cache
+    if cached_version != version:
+        payload = json.dumps({"insights": get_campaign_insights()})
+        _insights_cache = (version, payload)
+        _executor.submit(_warm_diagnostics_cache)
+
+    response = Response(payload, mimetype="application/json")
+    response.set_etag(etag, weak=True)
+    return response
 
 
 # -------------------------------------------------------
@@ -161,13 +284,12 @@ def export_report(campaign_id):
         return jsonify({"error": "Campaign not found"}), 404
 
     diagnostics = run_diagnostics(campaign)
-    pdf_path = generate_pdf_report(campaign, diagnostics)
 
-    return send_from_directory(
-        directory=os.path.dirname(pdf_path),
-        path=os.path.basename(pdf_path),
-        as_attachment=True
-    )
+    # Saved reports are reused while the campaign is unchanged,
+    # so repeated downloads skip building the PDF again
+    filepath = generate_pdf_report(campaign, diagnostics)
+
+    return send_file(filepath, as_attachment=True, download_name=filepath.name)
 
 
 # -------------------------------------------------------
@@ -188,4 +310,13 @@ if __name__ == "__main__":
     print("\n🚀 Starting Ad Campaign Simulator Backend...")
     print("📡 API running at: http://localhost:5000")
     print("🛑 Press CTRL+C to stop\n")
-    app.run(debug=True, port=5000)
+
+    # waitress is a production server: it handles 8 requests at a time
+    # and skips the debugger/reloader overhead of Flask's dev server
+    try:
+        from waitress import serve
+        serve(app, host="127.0.0.1", port=5000, threads=8)
+    except ImportError:
+        print("⚠️  waitress not installed - using Flask's development server.")
+        print("   Run: pip install waitress")
+        app.run(port=5000, threaded=True)
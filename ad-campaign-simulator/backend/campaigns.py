@@ -12,7 +12,81 @@
   We automatically calculate: CTR, CPC, Conversion Rate
 """
 
-from database import get_db_connection
+from datetime import datetime, timezone
+
+import numpy as np
+
+from database import get_db_connection, get_fast_cursor
+from diagnostics import run_diagnostics, run_diagnostics_batch, RULES_FINGERPRINT
+
+# -------------------------------------------------------
+# SQL statements
+# Defined once here so every call reuses the same string, which
+# sqlite3 finds in its prepared-statement cache instead of re-parsing.
+# -------------------------------------------------------
+INSERT_CAMPAIGN_SQL = """
+    INSERT INTO campaigns (name, budget, impressions, clicks, conversions, ctr, cpc, conversion_rate, created_at,
+                           health_score, issues_found, top_issue)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SELECT_ALL_CAMPAIGNS_SQL = """
+    SELECT id, name, budget, impressions, clicks, conversions,
+           ctr, cpc, conversion_rate, status, created_at
+    FROM campaigns
+    ORDER BY created_at DESC
+"""
+
+SELECT_CAMPAIGN_BY_ID_SQL = """
+    SELECT id, name, budget, impressions, clicks, conversions,
+           ctr, cpc, conversion_rate, status, created_at
+    FROM campaigns
+    WHERE id = ?
+"""
+
+SELECT_SCORE_INPUTS_SQL = """
+    SELECT id, name, ctr, cpc, conversion_rate, budget, clicks, conversions
+    FROM campaigns
+"""
+
+SELECT_UNSCORED_CAMPAIGNS_SQL = SELECT_SCORE_INPUTS_SQL + "WHERE health_score IS NULL"
+
+SELECT_INSIGHTS_SQL = """
+    SELECT id AS campaign_id, name AS campaign_name, issues_found, health_score,
+           COALESCE(top_issue, 'None') AS top_issue
+    FROM campaigns
+    ORDER BY created_at DESC
+"""
+
+# Only rows whose saved summary differs are actually written
+UPDATE_SCORES_SQL = """
+    UPDATE campaigns
+    SET health_score = :health_score, issues_found = :issues_found, top_issue = :top_issue
+    WHERE id = :id
+      AND (health_score IS NOT :health_score
+           OR issues_found IS NOT :issues_found
+           OR top_issue IS NOT :top_issue)
+"""
+
+DELETE_CAMPAIGN_SQL = "DELETE FROM campaigns WHERE id = ?"
+
+DELETE_CAMPAIGN_LOGS_SQL = "DELETE FROM performance_logs WHERE campaign_id = ?"
+
+SELECT_CAMPAIGNS_VERSION_SQL = "SELECT value FROM meta WHERE key = 'campaigns_version'"
+
+
+def get_campaigns_version():
+    """
+    Returns the current campaigns version number, so callers can tell
+    when cached campaign-derived data (like the insights summary) has
+    gone stale.
+    
+    It goes up every time a campaign is created, changed or deleted -
+    by ANY process using the database (see the triggers in init_db).
+    """
+    cursor = get_fast_cursor()
+    cursor.execute(SELECT_CAMPAIGNS_VERSION_SQL)
+    return cursor.fetchone()[0]
 
 
 def calculate_metrics(budget, impressions, clicks, conversions):
@@ -33,6 +107,11 @@ def calculate_metrics(budget, impressions, clicks, conversions):
       - What % of people who CLICKED actually CONVERTED (bought/signed up)?
       - Formula: (conversions / clicks) * 100
       - Good conversion rate: 2-5% is average
+    
+    Only called when a campaign is SAVED. The results are stored in the
+    ctr / cpc / conversion_rate columns, so everything that reads a
+    campaign (diagnostics, reports, charts) uses the stored values
+    instead of doing the math again.
     """
     # Avoid division by zero errors
     ctr = round((clicks / impressions * 100), 2) if impressions > 0 else 0
@@ -42,6 +121,40 @@ def calculate_metrics(budget, impressions, clicks, conversions):
     return ctr, cpc, conversion_rate
 
 
+def calculate_metrics_batch(budgets, impressions, clicks, conversions):
+    """
+    Same as calculate_metrics(), but for MANY campaigns at once.
+    
+    Each argument is a list (one value per campaign). NumPy does the
+    math for the whole list in one go, which is much faster than
+    calling calculate_metrics() in a Python loop for bulk imports.
+    
+    Returns 3 lists: ctr, cpc, conversion_rate
+    """
+    budgets = np.asarray(budgets, dtype=np.float64)
+    impressions = np.asarray(impressions, dtype=np.float64)
+    clicks = np.asarray(clicks, dtype=np.float64)
+    conversions = np.asarray(conversions, dtype=np.float64)
+
+    # Avoid division by zero: only divide where the denominator is > 0,
+    # everything else stays 0 (just like calculate_metrics)
+    has_impressions = impressions > 0
+    has_clicks = clicks > 0
+    ctr = np.divide(clicks, impressions, out=np.zeros_like(clicks), where=has_impressions)
+    cpc = np.divide(budgets, clicks, out=np.zeros_like(budgets), where=has_clicks)
+    conversion_rate = np.divide(conversions, clicks, out=np.zeros_like(conversions), where=has_clicks)
+
+    # Rounded with Python's round(), NOT np.round: np.round scales by 100
+    # and rounds that, which is sometimes 0.01 off (3969.67 / 38 gives a
+    # CPC of 104.46 instead of 104.47). This way bulk-created campaigns
+    # store exactly the same metrics as create_campaign().
+    return (
+        [round(value, 2) for value in (ctr * 100).tolist()],
+        [round(value, 2) for value in cpc.tolist()],
+        [round(value, 2) for value in (conversion_rate * 100).tolist()],
+    )
+
+
 def create_campaign(data):
     """
     Saves a new campaign to the database.
@@ -49,8 +162,9 @@ def create_campaign(data):
     Steps:
     1. Extract values from the request data
     2. Calculate metrics
-    3. Insert into database
-    4. Return the saved campaign
+    3. Run diagnostics once, to save the health score with the campaign
+    4. Insert into database
+    5. Return the saved campaign (built from the values we just saved)
     """
     # Extract values (use .get() with defaults to prevent crashes)
     name = data.get("name", "Unnamed Campaign")
@@ -62,23 +176,93 @@ def create_campaign(data):
     # Auto-calculate the 3 metrics
     ctr, cpc, conversion_rate = calculate_metrics(budget, impressions, clicks, conversions)
 
-    # Save to database
+    # Same format SQLite's CURRENT_TIMESTAMP would store (UTC)
+    created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    # The complete campaign object - we already know every value,
+    # so there's no need to read it back from the database later
+    campaign = {
+        "name": name,
+        "budget": budget,
+        "impressions": impressions,
+        "clicks": clicks,
+        "conversions": conversions,
+        "ctr": ctr,
+        "cpc": cpc,
+        "conversion_rate": conversion_rate,
+        "status": "active",
+        "created_at": created_at,
+    }
+
+    # Diagnostic summary for the insights list
+    result = run_diagnostics(campaign)
+    issues = result["issues"]
+    top_issue = issues[0]["type"] if issues else None
+
+    # Save to database - "with conn" commits, or rolls back if the
+    # INSERT fails (the connection is reused, so it must never be
+    # left in the middle of a transaction)
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO campaigns (name, budget, impressions, clicks, conversions, ctr, cpc, conversion_rate)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (name, budget, impressions, clicks, conversions, ctr, cpc, conversion_rate))
+    with conn:
+        cursor.execute(INSERT_CAMPAIGN_SQL, (
+            name, budget, impressions, clicks, conversions, ctr, cpc, conversion_rate, created_at,
+            result["health_score"], len(issues), top_issue
+        ))
+
 
-    conn.commit()
+    campaign["id"] = cursor.lastrowid  # The ID that was just auto-generated
+    return campaign
 
-    # Get the ID that was just auto-generated
-    new_id = cursor.lastrowid
-    conn.close()
 
-    # Return the complete campaign object
-    return get_campaign_by_id(new_id)
+def create_campaigns_bulk(campaigns_data):
+    """
+    Saves MANY new campaigns to the database in one go.
+    
+    Works like calling create_campaign() for each item, but:
+    - metrics and health scores are calculated for all campaigns at once
+    - all rows are inserted with a single executemany()
+    - there is only ONE commit at the end instead of one per campaign
+    
+    Returns how many campaigns were created.
+    """
+    if not campaigns_data:
+        return 0
+
+    # Extract values (same defaults as create_campaign)
+    names = [d.get("name", "Unnamed Campaign") for d in campaigns_data]
+    budgets = [float(d.get("budget", 0)) for d in campaigns_data]
+    impressions = [int(d.get("impressions", 0)) for d in campaigns_data]
+    clicks = [int(d.get("clicks", 0)) for d in campaigns_data]
+    conversions = [int(d.get("conversions", 0)) for d in campaigns_data]
+
+    # Auto-calculate the 3 metrics for every campaign at once
+    ctrs, cpcs, conversion_rates = calculate_metrics_batch(budgets, impressions, clicks, conversions)
+
+    # ...and the diagnostic summary too (same rules as run_diagnostics)
+    results = run_diagnostics_batch([
+        {"budget": b, "clicks": c, "conversions": v, "ctr": ctr, "cpc": cpc, "conversion_rate": cr}
+        for b, c, v, ctr, cpc, cr in zip(budgets, clicks, conversions, ctrs, cpcs, conversion_rates)
+    ])
+    health_scores = [result["health_score"] for result in results]
+    issue_counts = [len(result["issues"]) for result in results]
+    top_issues = [result["issues"][0]["type"] if result["issues"] else None for result in results]
+
+    created_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    rows = list(zip(
+        names, budgets, impressions, clicks, conversions,
+        ctrs, cpcs, conversion_rates,
+        [created_at] * len(names),
+        health_scores, issue_counts, top_issues
+    ))
+
+    # Save to database - "with conn" commits once when the block ends
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(INSERT_CAMPAIGN_SQL, rows)
+
+    return len(rows)
 
 
 def get_all_campaigns():
@@ -86,15 +270,14 @@ def get_all_campaigns():
     Fetches ALL campaigns from the database.
     Returns a list of dictionaries.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM campaigns ORDER BY created_at DESC")
+    cursor = get_fast_cursor()  # Plain tuples - we build the dicts ourselves below
+    cursor.execute(SELECT_ALL_CAMPAIGNS_SQL)
     rows = cursor.fetchall()
-    conn.close()
 
     # Convert rows to plain Python dictionaries
-    return [dict(row) for row in rows]
+    # (column names are looked up once, not again for every row)
+    cols = [c[0] for c in cursor.description]
+    return [dict(zip(cols, row)) for row in rows]
 
 
 def get_campaign_by_id(campaign_id):
@@ -102,15 +285,13 @@ def get_campaign_by_id(campaign_id):
     Fetches ONE specific campaign by its ID.
     Returns None if not found.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM campaigns WHERE id = ?", (campaign_id,))
+    cursor = get_fast_cursor()
+    cursor.execute(SELECT_CAMPAIGN_BY_ID_SQL, (campaign_id,))
     row = cursor.fetchone()
-    conn.close()
 
     if row:
-        return dict(row)
+        cols = [c[0] for c in cursor.description]
+        return dict(zip(cols, row))
     return None
 
 
@@ -122,16 +303,69 @@ def delete_campaign(campaign_id):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # First check if it exists
-    cursor.execute("SELECT id FROM campaigns WHERE id = ?", (campaign_id,))
-    if not cursor.fetchone():
-        conn.close()
-        return False
-
-    # Delete it
-    cursor.execute("DELETE FROM campaigns WHERE id = ?", (campaign_id,))
-    # Also delete its performance logs
-    cursor.execute("DELETE FROM performance_logs WHERE campaign_id = ?", (campaign_id,))
-    conn.commit()
-    conn.close()
+    # "with conn" commits both deletes together (or rolls back on error)
+    with conn:
+        # Delete it - rowcount tells us whether it existed at all
+        cursor.execute(DELETE_CAMPAIGN_SQL, (campaign_id,))
+        if cursor.rowcount == 0:
+            return False
+
+        # Also delete its performance logs
+        cursor.execute(DELETE_CAMPAIGN_LOGS_SQL, (campaign_id,))
+
     return True
+
+
+def refresh_campaign_scores():
+    """
+    Keeps the saved diagnostic summary (health_score, issues_found,
+    top_issue) of every campaign in line with the current RULES.
+    Run at startup.
+    
+    The database remembers which version of the rules its summaries
+    were made with (RULES_FINGERPRINT, stored in PRAGMA user_version):
+    - rules unchanged: only campaigns WITHOUT a summary yet are scored
+      (e.g. saved before these columns existed) - usually none at all
+    - rules changed (e.g. THRESHOLDS edited): every campaign is rescored
+    
+    Returns how many campaigns were scored.
+    """
+    conn = get_db_connection()
+    rules_changed = conn.execute("PRAGMA user_version").fetchone()[0] != RULES_FINGERPRINT
+
+    cursor = get_fast_cursor()
+    cursor.execute(SELECT_SCORE_INPUTS_SQL if rules_changed else SELECT_UNSCORED_CAMPAIGNS_SQL)
+    cols = [c[0] for c in cursor.description]
+    campaigns = [dict(zip(cols, row)) for row in cursor.fetchall()]
+
+    # Score them all at once (same rules as run_diagnostics)
+    updates = []
+    for campaign, result in zip(campaigns, run_diagnostics_batch(campaigns)):
+        issues = result["issues"]
+        updates.append({
+            "id": campaign["id"],
+            "health_score": result["health_score"],
+            "issues_found": len(issues),
+            "top_issue": issues[0]["type"] if issues else None,
+        })
+
+    with conn:
+        conn.executemany(UPDATE_SCORES_SQL, updates)
+        if rules_changed:
+            conn.execute(f"PRAGMA user_version = {RULES_FINGERPRINT}")
+
+    return len(updates)
+
+
+def get_campaign_insights():
+    """
+    Returns the saved diagnostic summary of ALL campaigns, newest first.
+    Each item has: campaign_id, campaign_name, issues_found,
+    health_score and top_issue.
+    """
+    cursor = get_fast_cursor()
+    cursor.execute(SELECT_INSIGHTS_SQL)
+    rows = cursor.fetchall()
+
+    cols = [c[0] for c in cursor.description]
+    return [dict(zip(cols, row)) for row in rows]
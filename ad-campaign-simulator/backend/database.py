@@ -11,25 +11,56 @@
 """
 
 import sqlite3
+import threading
 import os
 
 # Path where our database file will be saved
 DB_PATH = os.path.join(os.path.dirname(__file__), "campaigns.db")
 
+# Each server thread keeps its own long-lived connection here
+_local = threading.local()
+
 
 def get_db_connection():
     """
-    Opens a connection to the database.
+    Returns a connection to the database.
+    
+    Think of this like opening a spreadsheet file - except we only
+    open it ONCE per thread and keep it open, instead of opening and
+    closing the file on every request. Don't close it when you're done!
     
-    Think of this like opening a spreadsheet file.
     row_factory makes rows return as dictionaries (key: value)
     instead of plain tuples - much easier to work with!
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Rows become dict-like objects
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # cached_statements: remember up to 256 parsed SQL statements
+        conn = sqlite3.connect(DB_PATH, cached_statements=256)
+        conn.row_factory = sqlite3.Row  # Rows become dict-like objects
+
+        # WAL lets readers and a writer work at the same time, and
+        # synchronous=NORMAL skips the extra disk flush on every commit
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        _local.conn = conn
     return conn
 
 
+def get_fast_cursor():
+    """
+    Returns a cursor whose rows are plain tuples instead of sqlite3.Row.
+    
+    sqlite3.Row wraps every row in an extra Python object. For read-heavy
+    queries it's faster to get bare tuples and use cursor.description
+    (the list of column names) to build dictionaries ourselves.
+    """
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = None
+    return cursor
+
+
 def init_db():
     """
     Creates the database and tables if they don't exist yet.
@@ -46,6 +77,9 @@ def init_db():
     - cpc: Cost Per Click = budget/clicks
     - conversion_rate: conversions/clicks * 100
     - created_at: when was this campaign added
+    - health_score, issues_found, top_issue: diagnostic summary, saved
+      when the campaign is created so the dashboard doesn't re-run
+      diagnostics on every load
     """
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -63,10 +97,22 @@ def init_db():
             cpc             REAL,
             conversion_rate REAL,
             status          TEXT DEFAULT 'active',
-            created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            health_score    INTEGER,
+            issues_found    INTEGER,
+            top_issue       TEXT
         )
     """)
 
+    # Databases created by older versions don't have the diagnostic
+    # summary columns yet - add any that are missing
+    existing_columns = {row["name"] for row in cursor.execute("PRAGMA table_info(campaigns)")}
+    for column, column_type in (("health_score", "INTEGER"),
+                                ("issues_found", "INTEGER"),
+                                ("top_issue", "TEXT")):
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE campaigns ADD COLUMN {column} {column_type}")
+
     # Performance log table - tracks history of changes
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS performance_logs (
@@ -79,6 +125,42 @@ def init_db():
         )
     """)
 
+    # Indexes make the dashboard's "newest first" list and the
+    # per-campaign log cleanup (on delete) fast even with many rows
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_campaigns_created_at
+        ON campaigns(created_at DESC)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_perflogs_campaign
+        ON performance_logs(campaign_id)
+    """)
+
+    # The campaigns "version": a counter that goes up whenever the
+    # campaigns table changes, used to tell when cached data is stale.
+    # It lives IN the database and triggers bump it in the same
+    # transaction as the change, so every process that writes (other
+    # server workers, python seed_data.py, ...) moves it forward.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    # Starts at the current time in ms, not 0, so a re-created database
+    # never repeats a version (and ETag) that an older one handed out
+    cursor.execute("""
+        INSERT OR IGNORE INTO meta (key, value)
+        VALUES ('campaigns_version', CAST(strftime('%s', 'now') AS INTEGER) * 1000)
+    """)
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS bump_campaigns_version_on_{event.lower()}
+            AFTER {event} ON campaigns
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'campaigns_version';
+            END
+        """)
+
     conn.commit()  # Save changes
-    conn.close()   # Close connection (good practice!)
     print(f"📂 Database ready at: {DB_PATH}")
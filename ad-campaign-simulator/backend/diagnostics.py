@@ -23,6 +23,14 @@
   - Final score = overall campaign health (0-100)
 """
 
+from functools import lru_cache
+from types import MappingProxyType
+import hashlib
+import operator
+import sys
+
+import numpy as np
+
 # -------------------------------------------------------
 # THRESHOLDS (The Rules)
 # These numbers define what is "bad" for each metric
@@ -239,114 +247,173 @@ ISSUE_DEFINITIONS = {
 }
 
 
+# The definitions never change, so share them read-only: lists become
+# tuples and each definition becomes a read-only view (MappingProxyType).
+# Issues only point at them by "type" instead of copying them.
+# Every text is interned (sys.intern), so each string exists exactly once
+# and comparing two of them is usually a quick identity check.
+def _frozen(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return tuple(sys.intern(text) for text in value)
+    return value
+
+
+ISSUE_DEFINITIONS = MappingProxyType({
+    sys.intern(issue_type): MappingProxyType({
+        key: _frozen(value) for key, value in definition.items()
+    })
+    for issue_type, definition in ISSUE_DEFINITIONS.items()
+})
+
+
+def _is_zero(value, threshold):
+    """
+    Rule comparison for "none at all": value == 0.
+    (The threshold is only reported with the issue, not compared -
+    works on single numbers and on NumPy arrays alike.)
+    """
+    return value == 0
+
+
+# -------------------------------------------------------
+# RULE TABLE
+# Every check run_diagnostics makes, flattened into one table that is
+# built once at import (no THRESHOLDS lookups per campaign).
+# Each row: (group, comparison, metric, threshold, issue type,
+#            score deduction, only if clicks > this (or None))
+# Rules in the same group are alternatives: critical is listed first,
+# and the warning is only checked if the critical didn't fire.
+# -------------------------------------------------------
+RULES = tuple(
+    (group, op, key, threshold, issue_type, ISSUE_DEFINITIONS[issue_type]["score_deduction"], min_clicks)
+    for group, op, key, threshold, issue_type, min_clicks in (
+        # RULE 1: CTR too low
+        (0, operator.lt, "ctr", THRESHOLDS["ctr"]["critical"], "LOW_CTR_CRITICAL", None),
+        (0, operator.lt, "ctr", THRESHOLDS["ctr"]["warning"], "LOW_CTR_WARNING", None),
+        # RULE 2: CPC too high
+        (1, operator.gt, "cpc", THRESHOLDS["cpc"]["critical"], "HIGH_CPC_CRITICAL", None),
+        (1, operator.gt, "cpc", THRESHOLDS["cpc"]["warning"], "HIGH_CPC_WARNING", None),
+        # RULE 3: Conversion rate too low (only meaningful with enough clicks)
+        (2, operator.lt, "conversion_rate", THRESHOLDS["conversion_rate"]["critical"], "LOW_CONVERSION_CRITICAL", 50),
+        (2, operator.lt, "conversion_rate", THRESHOLDS["conversion_rate"]["warning"], "LOW_CONVERSION_WARNING", 20),
+        # RULE 4: Tracking failure - many clicks but ZERO conversions
+        # (exactly 0, reported against a threshold of 1 conversion)
+        (3, _is_zero, "conversions", 1, "TRACKING_FAILURE", 100),
+        # RULE 5: Budget running out
+        (4, operator.lt, "budget_remaining_pct", THRESHOLDS["budget_remaining_pct"]["exhausted"], "BUDGET_EXHAUSTED", None),
+        (4, operator.lt, "budget_remaining_pct", THRESHOLDS["budget_remaining_pct"]["low"], "BUDGET_LOW", None),
+    )
+)
+RULE_GROUPS = 5
+
+# A number that changes whenever RULES does (thresholds, deductions,
+# order...). Health scores saved in the database remember it, so they
+# can be recalculated after the rules change.
+# (31 bits, so it fits in SQLite's "PRAGMA user_version")
+# (comparisons are hashed by name - a function's repr changes every run)
+RULES_FINGERPRINT = int.from_bytes(
+    hashlib.blake2b(
+        repr([(rule[0], rule[1].__name__, *rule[2:]) for rule in RULES]).encode("utf-8"),
+        digest_size=4,
+    ).digest(), "big"
+) & 0x7FFFFFFF
+
+# Recommendations per issue type, looked up directly when building reports
+_RECS_BY_TYPE = {
+    issue_type: definition["recommendations"]
+    for issue_type, definition in ISSUE_DEFINITIONS.items()
+}
+
+
+def hydrate(issue):
+    """
+    Turns a small issue record from run_diagnostics() into the full issue:
+    its ISSUE_DEFINITIONS entry (title, description, root causes, ...)
+    plus the record's metric_value and threshold.
+    Only needed when sending the issue to the user (JSON, reports).
+    """
+    return {**ISSUE_DEFINITIONS[issue["type"]], **issue}
+
+
 def run_diagnostics(campaign):
     """
     MAIN FUNCTION: Analyzes a campaign and returns all detected issues.
     
     This is the diagnostic engine. Think of it as running a health check.
+    It reads the ctr / cpc / conversion_rate already stored on the
+    campaign - it never recalculates them from the raw counts.
     
     Returns a dictionary with:
     - health_score: 0-100 overall campaign health
-    - issues: list of detected problems
+    - issues: list of detected problems - small records with just the
+      issue type, metric_value and threshold (use hydrate() to get the
+      full title / description / root causes)
     - recommendations: combined list of all recommendations
     - summary: one-line status message
+    
+    Results are cached per unique set of campaign values, so the returned
+    dict may be shared between callers - don't modify it!
     """
+    # Missing values and NULLs (None) both count as 0
+    g = campaign.get
+    return _run_diagnostics_cached(
+        g("id"), g("name"),
+        g("ctr") or 0, g("cpc") or 0, g("conversion_rate") or 0,
+        g("budget") or 0, g("clicks") or 0, g("conversions") or 0,
+    )
+
+
+@lru_cache(maxsize=1024)
+def _run_diagnostics_cached(campaign_id, name, ctr, cpc, conversion_rate, budget, clicks, conversions):
+    """Runs the rule engine once per unique set of campaign values."""
     issues = []
     score = 100  # Start perfect, deduct for issues
 
-    ctr = campaign.get("ctr", 0) or 0
-    cpc = campaign.get("cpc", 0) or 0
-    conversion_rate = campaign.get("conversion_rate", 0) or 0
-    budget = campaign.get("budget", 0) or 0
-    clicks = campaign.get("clicks", 0) or 0
-    conversions = campaign.get("conversions", 0) or 0
-
     # Estimate "budget spent" as CPC * clicks
     budget_spent = cpc * clicks
     budget_remaining_pct = ((budget - budget_spent) / budget * 100) if budget > 0 else 100
 
-    # -------------------------------------------------------
-    # RULE 1: Check CTR
-    # -------------------------------------------------------
-    if ctr < THRESHOLDS["ctr"]["critical"]:
-        issue = ISSUE_DEFINITIONS["LOW_CTR_CRITICAL"].copy()
-        issue["metric_value"] = ctr
-        issue["threshold"] = THRESHOLDS["ctr"]["critical"]
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    elif ctr < THRESHOLDS["ctr"]["warning"]:
-        issue = ISSUE_DEFINITIONS["LOW_CTR_WARNING"].copy()
-        issue["metric_value"] = ctr
-        issue["threshold"] = THRESHOLDS["ctr"]["warning"]
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    # -------------------------------------------------------
-    # RULE 2: Check CPC
-    # -------------------------------------------------------
-    if cpc > THRESHOLDS["cpc"]["critical"]:
-        issue = ISSUE_DEFINITIONS["HIGH_CPC_CRITICAL"].copy()
-        issue["metric_value"] = cpc
-        issue["threshold"] = THRESHOLDS["cpc"]["critical"]
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    elif cpc > THRESHOLDS["cpc"]["warning"]:
-        issue = ISSUE_DEFINITIONS["HIGH_CPC_WARNING"].copy()
-        issue["metric_value"] = cpc
-        issue["threshold"] = THRESHOLDS["cpc"]["warning"]
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    # -------------------------------------------------------
-    # RULE 3: Check Conversion Rate
-    # -------------------------------------------------------
-    if conversion_rate < THRESHOLDS["conversion_rate"]["critical"] and clicks > 50:
-        issue = ISSUE_DEFINITIONS["LOW_CONVERSION_CRITICAL"].copy()
-        issue["metric_value"] = conversion_rate
-        issue["threshold"] = THRESHOLDS["conversion_rate"]["critical"]
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    elif conversion_rate < THRESHOLDS["conversion_rate"]["warning"] and clicks > 20:
-        issue = ISSUE_DEFINITIONS["LOW_CONVERSION_WARNING"].copy()
-        issue["metric_value"] = conversion_rate
-        issue["threshold"] = THRESHOLDS["conversion_rate"]["warning"]
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    # -------------------------------------------------------
-    # RULE 4: Tracking Failure Detection
-    # Logic: if there are many clicks but ZERO conversions, something's wrong
-    # -------------------------------------------------------
-    if clicks > 100 and conversions == 0:
-        issue = ISSUE_DEFINITIONS["TRACKING_FAILURE"].copy()
-        issue["metric_value"] = 0
-        issue["threshold"] = 1
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    # -------------------------------------------------------
-    # RULE 5: Budget Exhaustion
-    # -------------------------------------------------------
-    if budget_remaining_pct < THRESHOLDS["budget_remaining_pct"]["exhausted"]:
-        issue = ISSUE_DEFINITIONS["BUDGET_EXHAUSTED"].copy()
-        issue["metric_value"] = budget_remaining_pct
-        issue["threshold"] = THRESHOLDS["budget_remaining_pct"]["exhausted"]
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    elif budget_remaining_pct < THRESHOLDS["budget_remaining_pct"]["low"]:
-        issue = ISSUE_DEFINITIONS["BUDGET_LOW"].copy()
-        issue["metric_value"] = budget_remaining_pct
-        issue["threshold"] = THRESHOLDS["budget_remaining_pct"]["low"]
-        issues.append(issue)
-        score -= issue["score_deduction"]
-
-    # Clamp score between 0 and 100
-    health_score = max(0, min(100, score))
+    metrics = {
+        "ctr": ctr,
+        "cpc": cpc,
+        "conversion_rate": conversion_rate,
+        "conversions": conversions,
+        "budget_remaining_pct": budget_remaining_pct,
+    }
+
+    # Walk the rule table (see RULES above). Once a rule in a group
+    # fires, the rest of that group is skipped - just like an elif.
+    fired = [False] * RULE_GROUPS
+    for group, op, key, threshold, issue_type, deduction, min_clicks in RULES:
+        if fired[group]:
+            continue
+        value = metrics[key]
+        if op(value, threshold) and (min_clicks is None or clicks > min_clicks):
+            fired[group] = True
+            issues.append({"type": issue_type, "metric_value": value, "threshold": threshold})
+            score -= deduction
+
+    # Clamp score between 0 and 100 (plain comparisons - cheaper than max/min calls)
+    health_score = 100 if score > 100 else score
+    health_score = 0 if health_score < 0 else health_score
+
+    return _build_report(campaign_id, name, health_score, issues,
+                         ctr, cpc, conversion_rate, budget_remaining_pct)
+
 
+# Same interface as an lru_cache function, without exposing the cached helper
+run_diagnostics.cache_info = _run_diagnostics_cached.cache_info
+run_diagnostics.cache_clear = _run_diagnostics_cached.cache_clear
+
+
+def _build_report(campaign_id, campaign_name, health_score, issues,
+                  ctr, cpc, conversion_rate, budget_remaining_pct):
+    """
+    Puts together the final diagnostics dictionary (summary label,
+    combined recommendations, analyzed metrics) once the rules have run.
+    """
     # Generate a summary label
     if health_score >= 80:
         summary = "✅ Campaign is performing well"
@@ -358,16 +425,17 @@ def run_diagnostics(campaign):
         summary = "🚨 Campaign has critical issues requiring immediate action"
         status = "critical"
 
-    # Collect all unique recommendations
-    all_recommendations = []
+    # Collect all unique recommendations, in order
+    # (dict keys are unique and keep insertion order - no list scanning)
+    seen = {}
     for issue in issues:
-        for rec in issue.get("recommendations", []):
-            if rec not in all_recommendations:
-                all_recommendations.append(rec)
+        for rec in _RECS_BY_TYPE[issue["type"]]:
+            seen[rec] = None
+    all_recommendations = list(seen)
 
     return {
-        "campaign_id": campaign.get("id"),
-        "campaign_name": campaign.get("name"),
+        "campaign_id": campaign_id,
+        "campaign_name": campaign_name,
         "health_score": health_score,
         "status": status,
         "summary": summary,
@@ -380,3 +448,90 @@ def run_diagnostics(campaign):
             "budget_remaining_pct": round(budget_remaining_pct, 1),
         }
     }
+
+
+def run_diagnostics_batch(campaigns):
+    """
+    Same as calling run_diagnostics() on every campaign in the list,
+    but MUCH faster for many campaigns.
+    
+    Instead of walking the if/elif rules once per campaign, NumPy checks
+    each rule against ALL campaigns at once (one array comparison per
+    rule). Python only builds issue dictionaries for the rules that
+    actually fired.
+    
+    Returns a list of diagnostics dictionaries, in the same order.
+    """
+    if not campaigns:
+        return []
+
+    # Read every metric once into a plain list (keeps the original
+    # values for the report), then into a NumPy array (for the math)
+    ctr_values = [c.get("ctr", 0) or 0 for c in campaigns]
+    cpc_values = [c.get("cpc", 0) or 0 for c in campaigns]
+    conversion_values = [c.get("conversion_rate", 0) or 0 for c in campaigns]
+
+    ctr = np.array(ctr_values, dtype=np.float64)
+    cpc = np.array(cpc_values, dtype=np.float64)
+    conversion_rate = np.array(conversion_values, dtype=np.float64)
+    budget = np.fromiter((c.get("budget", 0) or 0 for c in campaigns), dtype=np.float64, count=len(campaigns))
+    clicks = np.fromiter((c.get("clicks", 0) or 0 for c in campaigns), dtype=np.int64, count=len(campaigns))
+    conversions = np.fromiter((c.get("conversions", 0) or 0 for c in campaigns), dtype=np.int64, count=len(campaigns))
+
+    # Estimate "budget spent" as CPC * clicks
+    budget_spent = cpc * clicks
+    # Only divide where there is a budget; the rest keep the 100% default.
+    # (budget - spent) / budget * 100 in the same order as run_diagnostics,
+    # so both give bit-for-bit the same percentages at the thresholds.
+    budget_remaining_pct = np.divide(budget - budget_spent, budget,
+                                     out=np.ones_like(budget), where=budget > 0)
+    budget_remaining_pct *= 100
+
+    budget_pct_values = budget_remaining_pct.tolist()
+    arrays = {
+        "ctr": ctr,
+        "cpc": cpc,
+        "conversion_rate": conversion_rate,
+        "conversions": conversions,
+        "budget_remaining_pct": budget_remaining_pct,
+    }
+    values = {
+        "ctr": ctr_values,
+        "cpc": cpc_values,
+        "conversion_rate": conversion_values,
+        "conversions": conversions.tolist(),
+        "budget_remaining_pct": budget_pct_values,
+    }
+
+    # One True/False mask per rule in RULES. "& ~fired[group]" reproduces
+    # the elif: a warning only counts if the critical didn't fire.
+    fired = np.zeros((RULE_GROUPS, len(campaigns)), dtype=bool)
+    masks = []
+    for group, op, key, threshold, issue_type, deduction, min_clicks in RULES:
+        mask = op(arrays[key], threshold) & ~fired[group]
+        if min_clicks is not None:
+            mask &= clicks > min_clicks
+        fired[group] |= mask
+        masks.append(mask)
+
+    # Health scores for every campaign in one matrix-vector product
+    deductions = np.array([rule[5] for rule in RULES])
+    health_scores = 100 - deductions @ np.stack(masks)
+    np.clip(health_scores, 0, 100, out=health_scores)
+    health_scores = health_scores.tolist()
+
+    # Only build issue records where a rule actually fired
+    issues_per_campaign = [[] for _ in campaigns]
+    for (group, op, key, threshold, issue_type, deduction, min_clicks), mask in zip(RULES, masks):
+        metric_values = values[key]
+        for i in np.flatnonzero(mask).tolist():
+            issues_per_campaign[i].append(
+                {"type": issue_type, "metric_value": metric_values[i], "threshold": threshold}
+            )
+
+    return [
+        _build_report(campaign.get("id"), campaign.get("name"),
+                      health_scores[i], issues_per_campaign[i],
+                      ctr_values[i], cpc_values[i], conversion_values[i], budget_pct_values[i])
+        for i, campaign in enumerate(campaigns)
+    ]
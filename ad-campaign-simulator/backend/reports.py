@@ -8,85 +8,236 @@
   Install: pip install reportlab
 """
 
+import hashlib
+import io
+import json
 import os
+import tempfile
+import time
 from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from types import SimpleNamespace
 
-# We'll use reportlab for PDF generation
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
-    print("⚠️  reportlab not installed. PDF export will use text format.")
-    print("   Run: pip install reportlab")
+from diagnostics import ISSUE_DEFINITIONS
+
+# -------------------------------------------------------
+# reportlab (loaded on first use)
+# Importing reportlab is slow (fonts, PIL, ...), so it only happens the
+# first time a report is requested - not whenever this module is imported.
+# The PDF styles are built at the same time, ONCE, and shared by every
+# report - creating a stylesheet is one of the slowest steps of a PDF run.
+# -------------------------------------------------------
+_RL = None  # None = not tried yet, False = not installed
+
+
+def _load_rl():
+    """
+    Imports reportlab and builds the shared PDF styles on the first call.
+    Returns a namespace with everything the PDF generator needs,
+    or False if reportlab isn't installed.
+    """
+    global _RL
+    if _RL is not None:
+        return _RL
+
+    try:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
+    except ImportError:
+        print("⚠️  reportlab not installed. PDF export will use text format.")
+        print("   Run: pip install reportlab")
+        _RL = False
+        return _RL
+
+    styles = getSampleStyleSheet()
+
+    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'],
+                                   fontSize=14, textColor=colors.HexColor("#16213e"),
+                                   spaceBefore=12, spaceAfter=6)
+    # A copy, so changing the font size doesn't touch the shared BodyText style
+    body_style = styles['BodyText'].clone('Body10', fontSize=10)
+
+    # Issue severity -> color, and a heading style per severity so
+    # each issue title is printed in its severity color
+    sev_color = {
+        "critical": colors.HexColor("#ff4444"),
+        "warning": colors.HexColor("#ff9900"),
+        "info": colors.HexColor("#0066cc"),
+    }
+
+    _RL = SimpleNamespace(
+        letter=letter, inch=inch, colors=colors,
+        SimpleDocTemplate=SimpleDocTemplate, Paragraph=Paragraph, Spacer=Spacer,
+        Table=Table, HRFlowable=HRFlowable,
+        title_style=ParagraphStyle('Title', parent=styles['Title'],
+                                   fontSize=24, textColor=colors.HexColor("#1a1a2e"),
+                                   spaceAfter=6),
+        heading_style=heading_style,
+        body_style=body_style,
+        bold_body_style=ParagraphStyle('BoldBody', parent=body_style, fontName='Helvetica-Bold'),
+        footer_style=ParagraphStyle('Footer', parent=body_style, fontSize=8,
+                                    textColor=colors.grey, alignment=1),
+        sev_title_style={
+            sev: ParagraphStyle(f"Title_{sev}", parent=heading_style, textColor=color)
+            for sev, color in sev_color.items()
+        },
+        overview_table_style=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#0f3460")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f5f5f5")]),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('PADDING', (0, 0), (-1, -1), 8),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+        metrics_table_style=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#533483")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f0eeff")]),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('PADDING', (0, 0), (-1, -1), 8),
+        ]),
+    )
+    return _RL
+
+
+# Table header rows - identical in every report, so they're built once
+# and shared (tuples, so no report can change them by accident)
+_OVERVIEW_HEADER = ("Field", "Value")
+_METRICS_HEADER = ("Metric", "Value", "Benchmark")
 
 
 # Where to save generated reports
-REPORTS_DIR = os.path.join(os.path.dirname(__file__), "reports")
-os.makedirs(REPORTS_DIR, exist_ok=True)
+REPORTS_DIR = Path(__file__).resolve().parent / "reports"
+REPORTS_DIR.mkdir(exist_ok=True)
+
+# Part of every saved report's name. Bump it whenever the report layout
+# changes, so reports saved by older code are built again.
+REPORT_FORMAT_VERSION = 2
+
+# Saved reports nobody has asked for in this long are deleted
+REPORT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
 
 
 def generate_pdf_report(campaign, diagnostics):
     """
-    Generates a PDF report and saves it to the reports folder.
-    Returns the file path.
+    Generates a PDF report for a campaign, saves it to the reports
+    folder and returns the file path.
+    
+    Saved reports are named after their content (see _report_key), so
+    asking again for an unchanged campaign reuses the existing file
+    instead of building a new one. Each reuse marks the file as recently
+    used; files unused for REPORT_MAX_AGE_SECONDS are cleaned up.
     """
-    filename = f"campaign_{campaign['id']}_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(REPORTS_DIR, filename)
-
-    if REPORTLAB_AVAILABLE:
-        _generate_with_reportlab(filepath, campaign, diagnostics)
+    rl = _load_rl()
+    # Fallback to plain text if reportlab not installed
+    extension = ".pdf" if rl else ".txt"
+
+    filename = f"campaign_{campaign['id']}_report_{_report_key(campaign, diagnostics)}{extension}"
+    target = REPORTS_DIR / filename
+    try:
+        # Already generated? Just mark it as recently used.
+        # (os.utime, not touch(): touch would create an EMPTY file if the
+        # report was pruned a moment ago - this raises instead)
+        os.utime(target)
+        return target
+    except FileNotFoundError:
+        pass
+
+    generated_at = datetime.now().strftime('%B %d, %Y at %H:%M')
+    if rl:
+        _generate_with_reportlab(rl, target, campaign, diagnostics, generated_at)
     else:
-        # Fallback to plain text if reportlab not installed
-        filepath = filepath.replace(".pdf", ".txt")
-        _generate_text_report(filepath, campaign, diagnostics)
+        _generate_text_report(target, campaign, diagnostics, generated_at)
 
-    return filepath
+    _prune_old_reports()
+    return target
 
 
-def _generate_with_reportlab(filepath, campaign, diagnostics):
-    """Creates a formatted PDF using reportlab."""
-    doc = SimpleDocTemplate(filepath, pagesize=letter,
-                            rightMargin=0.75*inch, leftMargin=0.75*inch,
-                            topMargin=1*inch, bottomMargin=1*inch)
+def _prune_old_reports():
+    """
+    Deletes saved reports (and leftover temp files) that haven't been
+    used for REPORT_MAX_AGE_SECONDS - e.g. reports of deleted campaigns
+    or of campaigns whose data has changed since.
+    """
+    cutoff = time.time() - REPORT_MAX_AGE_SECONDS
+    for path in REPORTS_DIR.iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass  # Another request deleted it first
 
-    styles = getSampleStyleSheet()
-    elements = []
 
-    # Define custom styles
-    title_style = ParagraphStyle('Title', parent=styles['Title'],
-                                  fontSize=24, textColor=colors.HexColor("#1a1a2e"),
-                                  spaceAfter=6)
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'],
-                                    fontSize=14, textColor=colors.HexColor("#16213e"),
-                                    spaceBefore=12, spaceAfter=6)
-    body_style = styles['BodyText']
-    body_style.fontSize = 10
+def _save_atomically(target, write):
+    """
+    Saves a report file so other requests never see it half-written.
+    
+    write(f) writes the content into a temporary file (binary mode) in
+    the same folder, which is then renamed to target in one step
+    (os.replace). Until then, target either doesn't exist or is the
+    complete previous file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(temp_path, target)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _report_key(campaign, diagnostics):
+    """
+    Short fingerprint (BLAKE2b hash) of everything that goes into a
+    report. Same campaign + same diagnostics + same report format
+    = same key.
+    """
+    content = json.dumps({"v": REPORT_FORMAT_VERSION, "c": campaign, "d": diagnostics},
+                         sort_keys=True, default=str)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _generate_with_reportlab(rl, target, campaign, diagnostics, generated_at):
+    """
+    Creates a formatted PDF using reportlab (rl = the namespace from
+    _load_rl(), target = file path).
+    """
+    # Build the PDF in memory first and write the finished file
+    # in one go instead of many small writes
+    buffer = io.BytesIO()
+    doc = rl.SimpleDocTemplate(buffer, pagesize=rl.letter,
+                               rightMargin=0.75*rl.inch, leftMargin=0.75*rl.inch,
+                               topMargin=1*rl.inch, bottomMargin=1*rl.inch)
 
     # ---- HEADER ----
-    elements.append(Paragraph("📊 Ad Campaign Report", title_style))
-    elements.append(Paragraph(f"Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')}", body_style))
-    elements.append(HRFlowable(width="100%", thickness=2, color=colors.HexColor("#0f3460")))
-    elements.append(Spacer(1, 12))
+    header = [
+        rl.Paragraph("📊 Ad Campaign Report", rl.title_style),
+        rl.Paragraph(f"Generated: {generated_at}", rl.body_style),
+        rl.HRFlowable(width="100%", thickness=2, color=rl.colors.HexColor("#0f3460")),
+        rl.Spacer(1, 12),
+    ]
 
     # ---- CAMPAIGN OVERVIEW ----
-    elements.append(Paragraph("Campaign Overview", heading_style))
-
     # Health score color
     score = diagnostics.get("health_score", 0)
     if score >= 80:
-        score_color = colors.green
+        score_color = rl.colors.green
     elif score >= 50:
-        score_color = colors.orange
+        score_color = rl.colors.orange
     else:
-        score_color = colors.red
+        score_color = rl.colors.red
 
     overview_data = [
-        ["Field", "Value"],
+        _OVERVIEW_HEADER,
         ["Campaign Name", campaign.get("name", "")],
         ["Health Score", f"{score}/100"],
         ["Status", diagnostics.get("status", "").upper()],
@@ -96,95 +247,88 @@ def _generate_with_reportlab(filepath, campaign, diagnostics):
         ["Conversions", f"{campaign.get('conversions', 0):,}"],
     ]
 
-    overview_table = Table(overview_data, colWidths=[2.5*inch, 4*inch])
-    overview_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#0f3460")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f5f5f5")]),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('PADDING', (0, 0), (-1, -1), 8),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elements.append(overview_table)
-    elements.append(Spacer(1, 16))
+    overview_table = rl.Table(overview_data, colWidths=[2.5*rl.inch, 4*rl.inch])
+    overview_table.setStyle(rl.overview_table_style)
+    overview = [
+        rl.Paragraph("Campaign Overview", rl.heading_style),
+        overview_table,
+        rl.Spacer(1, 16),
+    ]
 
     # ---- KEY METRICS ----
-    elements.append(Paragraph("Key Metrics", heading_style))
-
     metrics = diagnostics.get("metrics_analyzed", {})
     metrics_data = [
-        ["Metric", "Value", "Benchmark"],
+        _METRICS_HEADER,
         ["CTR (Click-Through Rate)", f"{metrics.get('ctr', 0)}%", "≥ 2.0% is good"],
         ["CPC (Cost Per Click)", f"${metrics.get('cpc', 0)}", "≤ $5.00 is good"],
         ["Conversion Rate", f"{metrics.get('conversion_rate', 0)}%", "≥ 2.0% is good"],
         ["Budget Remaining", f"{metrics.get('budget_remaining_pct', 0)}%", "≥ 20% is safe"],
     ]
 
-    metrics_table = Table(metrics_data, colWidths=[2.5*inch, 2*inch, 2*inch])
-    metrics_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#533483")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f0eeff")]),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('PADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(metrics_table)
-    elements.append(Spacer(1, 16))
+    metrics_table = rl.Table(metrics_data, colWidths=[2.5*rl.inch, 2*rl.inch, 2*rl.inch])
+    metrics_table.setStyle(rl.metrics_table_style)
+    key_metrics = [
+        rl.Paragraph("Key Metrics", rl.heading_style),
+        metrics_table,
+        rl.Spacer(1, 16),
+    ]
 
     # ---- DETECTED ISSUES ----
     issues = diagnostics.get("issues", [])
-    elements.append(Paragraph(f"Detected Issues ({len(issues)} found)", heading_style))
+    issue_section = [rl.Paragraph(f"Detected Issues ({len(issues)} found)", rl.heading_style)]
 
     if not issues:
-        elements.append(Paragraph("✅ No issues detected. Campaign is healthy!", body_style))
+        issue_section.append(rl.Paragraph("✅ No issues detected. Campaign is healthy!", rl.body_style))
     else:
         for i, issue in enumerate(issues, 1):
-            sev = issue.get("severity", "info")
-            sev_color = {"critical": "#ff4444", "warning": "#ff9900", "info": "#0066cc"}.get(sev, "#333")
+            defn = ISSUE_DEFINITIONS[issue["type"]]
+            title_style = rl.sev_title_style.get(defn["severity"], rl.heading_style)
 
-            elements.append(Paragraph(f"{i}. {issue.get('title', 'Unknown Issue')}", heading_style))
-            elements.append(Paragraph(issue.get("description", ""), body_style))
+            issue_section += [
+                rl.Paragraph(f"{i}. {defn['title']}", title_style),
+                rl.Paragraph(defn["description"], rl.body_style),
+            ]
 
-            causes = issue.get("root_causes", [])
+            causes = defn["root_causes"]
             if causes:
-                elements.append(Paragraph("Possible Root Causes:", ParagraphStyle(
-                    'BoldBody', parent=body_style, fontName='Helvetica-Bold')))
-                for cause in causes[:3]:  # Limit to top 3
-                    elements.append(Paragraph(f"  • {cause}", body_style))
+                issue_section.append(rl.Paragraph("Possible Root Causes:", rl.bold_body_style))
+                issue_section += [
+                    rl.Paragraph(f"  • {cause}", rl.body_style)
+                    for cause in causes[:3]  # Limit to top 3
+                ]
 
-            elements.append(Spacer(1, 6))
+            issue_section.append(rl.Spacer(1, 6))
 
-    elements.append(Spacer(1, 12))
+    issue_section.append(rl.Spacer(1, 12))
 
     # ---- RECOMMENDATIONS ----
     recommendations = diagnostics.get("recommendations", [])
-    elements.append(Paragraph(f"Top Recommendations ({len(recommendations)} actions)", heading_style))
+    rec_section = [rl.Paragraph(f"Top Recommendations ({len(recommendations)} actions)", rl.heading_style)]
 
     for j, rec in enumerate(recommendations[:8], 1):  # Top 8 recs
-        elements.append(Paragraph(f"{j}. {rec}", body_style))
-        elements.append(Spacer(1, 3))
+        rec_section.append(rl.Paragraph(f"{j}. {rec}", rl.body_style))
+        rec_section.append(rl.Spacer(1, 3))
 
     # ---- FOOTER ----
-    elements.append(Spacer(1, 20))
-    elements.append(HRFlowable(width="100%", thickness=1, color=colors.grey))
-    elements.append(Paragraph("Generated by Ad Campaign Debugging & Analytics Simulator",
-                               ParagraphStyle('Footer', parent=body_style, fontSize=8,
-                                              textColor=colors.grey, alignment=1)))
+    footer = [
+        rl.Spacer(1, 20),
+        rl.HRFlowable(width="100%", thickness=1, color=rl.colors.grey),
+        rl.Paragraph("Generated by Ad Campaign Debugging & Analytics Simulator", rl.footer_style),
+    ]
+
+    sections = (header, overview, key_metrics, issue_section, rec_section, footer)
+    doc.build(list(chain.from_iterable(sections)))
 
-    doc.build(elements)
-    print(f"✅ PDF report saved: {filepath}")
+    _save_atomically(target, lambda f: f.write(buffer.getvalue()))
+    print(f"✅ PDF report saved: {target}")
 
 
-def _generate_text_report(filepath, campaign, diagnostics):
-    """Fallback plain-text report if reportlab isn't installed."""
+def _generate_text_report(target, campaign, diagnostics, generated_at):
+    """Fallback plain-text report if reportlab isn't installed (target = file path)."""
     lines = [
         "=" * 60,
         "  AD CAMPAIGN REPORT",
-        f"  Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')}",
+        f"  Generated: {generated_at}",
         "=" * 60,
         "",
         f"Campaign: {campaign.get('name')}",
@@ -200,14 +344,15 @@ def _generate_text_report(filepath, campaign, diagnostics):
     ]
 
     for issue in diagnostics.get("issues", []):
-        lines.append(f"[{issue.get('severity', '').upper()}] {issue.get('title')}")
-        lines.append(f"  {issue.get('description')}")
+        defn = ISSUE_DEFINITIONS[issue["type"]]
+        lines.append(f"[{defn['severity'].upper()}] {defn['title']}")
+        lines.append(f"  {defn['description']}")
 
     lines.append("")
     lines.append("--- RECOMMENDATIONS ---")
     for i, rec in enumerate(diagnostics.get("recommendations", []), 1):
         lines.append(f"{i}. {rec}")
 
-    with open(filepath, "w") as f:
-        f.write("\n".join(lines))
-    print(f"✅ Text report saved: {filepath}")
+    # Stream the lines out instead of joining them into one big string first
+    _save_atomically(target, lambda f: f.writelines(f"{line}\n".encode("utf-8") for line in lines))
+    print(f"✅ Text report saved: {target}")
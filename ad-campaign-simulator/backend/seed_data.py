@@ -14,11 +14,16 @@
   - Campaign 6: Multiple critical issues
 """
 
-from campaigns import create_campaign
+import sys
 
+from campaigns import create_campaigns_bulk
 
-def seed_example_campaigns():
-    """Creates 6 example campaigns covering different scenarios."""
+
+def seed_example_campaigns(quiet=False):
+    """
+    Creates 6 example campaigns covering different scenarios.
+    Pass quiet=True to skip the printed summary (e.g. from scripts or tests).
+    """
 
     example_campaigns = [
         # ---- HEALTHY CAMPAIGN ----
@@ -83,13 +88,14 @@ def seed_example_campaigns():
         },
     ]
 
-    count = 0
-    for campaign_data in example_campaigns:
-        create_campaign(campaign_data)
-        count += 1
-        print(f"  ✅ Created: {campaign_data['name']}")
+    # Insert them all in one transaction instead of one-by-one
+    count = create_campaigns_bulk(example_campaigns)
 
-    print(f"\n🌱 Seeded {count} example campaigns!")
+    if not quiet:
+        # Build the whole summary first and write it out in one go
+        lines = [f"  ✅ Created: {campaign_data['name']}" for campaign_data in example_campaigns]
+        lines.append(f"\n🌱 Seeded {count} example campaigns!")
+        sys.stdout.write("\n".join(lines) + "\n")
     return count
 
 